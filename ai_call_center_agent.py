@@ -15,7 +15,12 @@ from speech_recognition import UnknownValueError, RequestError
 import pvporcupine
 import azure.cognitiveservices.speech as speechsdk
 import pyaudio
-import struct
+from functools import partial
+import itertools
+from wake_word_service import WakeWordService
+from resilience import CircuitBreaker, CircuitOpenError, AdmissionQueue, OverloadedError
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 # Load environment variables
 load_dotenv()
@@ -27,23 +32,96 @@ logger = logging.getLogger(__name__)
 # Set up your OpenAI API key
 openai.api_key = os.getenv('OPENAI_API_KEY')
 
+# Fixed prompts spoken by the agent; synthesized up front so they survive a TTS outage
+GREETING = "Hello, how can I assist you today?"
+NOT_UNDERSTOOD = "Sorry, I couldn't understand that. Please try again."
+NOTHING_HEARD = "I didn't hear anything. Please try again."
+GENERIC_ERROR = "Sorry, an error occurred. Please try again later."
+ALL_BUSY = "All of our lines are busy right now. Please call again in a few minutes."
+ROUTER_ONLY = ("I'm having trouble reaching our assistant right now. "
+               "I can still help with order status or our return policy.")
+ORDER_STATUS = "Your order #12345 is in transit and expected to arrive on Friday."
+RETURN_POLICY = "Our return policy allows returns within 30 days for a full refund if the item is in original condition."
+END_CALL = "Thank you for calling. Anything else I can assist with?"
+FIXED_PROMPTS = (
+    GREETING, NOT_UNDERSTOOD, NOTHING_HEARD, GENERIC_ERROR, ALL_BUSY, ROUTER_ONLY,
+    ORDER_STATUS, RETURN_POLICY, END_CALL
+)
+
+# External dependencies guarded by a circuit breaker
+DEPENDENCIES = ("asr", "alt_asr", "llm", "tts")
+
+# Unique wake word stream ids for agents sharing one WakeWordService
+_line_ids = itertools.count(1)
+
 class AICallCenterAgent:
-    def __init__(self):
+    def __init__(self, admission=None, wake_word_service=None, breakers=None):
+        """Create an agent for one line.
+
+        Pass a shared AdmissionQueue when running several agents concurrently
+        so calls across all lines are admitted and shed together, and a shared
+        WakeWordService so every line's audio is batched in one detector pool.
+        breakers maps names in DEPENDENCIES to CircuitBreakers shared by all
+        lines, so one line's failures open the circuit for every line.
+        """
         self.conversation_history = []
         self.recognizer = sr.Recognizer()
         self.wake_word = "hey agent"
+        self.wake_words = None
+        self.wake_word_sensitivity = 0.5
+        self.wake_word_workers = 4
+        self.asr_timeout = 10.0
+        self.llm_timeout = 10.0
+        self.tts_timeout = 10.0
+        self.breaker_failure_threshold = 3
+        self.breaker_recovery_timeout = 30.0
+        self.max_concurrent_calls = 10
+        self.max_pending_calls = 20
+        self.latency_shed_threshold = 5.0
+        self.tts_cache_size = 100
+        self.tts_cache = OrderedDict()
+        self.prompt_audio = {}
+        self.provider_workers = 2
         self.call_duration = 0
         self.call_start_time = None
         pygame.mixer.init()
         self.load_config()
         self.session = None
-        self.porcupine = None
-        self.init_porcupine()
+        self.line_id = f"line-{next(_line_ids)}"
+        self.wake_word_service = wake_word_service
+        self.owns_wake_word_service = wake_word_service is None
+        if self.owns_wake_word_service:
+            self.init_wake_word_service()
         self.speech_config = speechsdk.SpeechConfig(
             subscription=os.getenv('AZURE_SPEECH_KEY'),
             region=os.getenv('AZURE_SPEECH_REGION')
         )
         self.speech_config.speech_synthesis_voice_name = "en-US-JennyNeural"
+        # Bound blocking Google calls so hung requests release their worker thread
+        self.recognizer.operation_timeout = self.asr_timeout
+        self.breakers = dict(breakers or {})
+        for name in DEPENDENCIES:
+            self.breakers.setdefault(name, self.create_breaker(name))
+        self.asr_breaker = self.breakers["asr"]
+        self.alt_asr_breaker = self.breakers["alt_asr"]
+        self.llm_breaker = self.breakers["llm"]
+        self.tts_breaker = self.breakers["tts"]
+        # Each blocking SDK gets its own small pool, so a hung provider can't starve
+        # the other provider or the default executor used for audio capture
+        self.alt_asr_executor = ThreadPoolExecutor(
+            max_workers=self.provider_workers,
+            thread_name_prefix="alt-asr"
+        )
+        self.tts_executor = ThreadPoolExecutor(
+            max_workers=self.provider_workers,
+            thread_name_prefix="tts"
+        )
+        self.admission = admission or AdmissionQueue(
+            max_concurrent=self.max_concurrent_calls,
+            max_pending=self.max_pending_calls,
+            latency_threshold=self.latency_shed_threshold
+        )
+        self.admission.watch(*self.breakers.values())
 
     def load_config(self):
         """Load configuration settings from config.json."""
@@ -56,6 +134,19 @@ class AICallCenterAgent:
             with open(config_path, 'r') as config_file:
                 config = json.load(config_file)
                 self.wake_word = config.get('wake_word', self.wake_word)
+                self.wake_words = config.get('wake_words', self.wake_words)
+                self.wake_word_sensitivity = config.get('wake_word_sensitivity', self.wake_word_sensitivity)
+                self.wake_word_workers = config.get('wake_word_workers', self.wake_word_workers)
+                self.asr_timeout = config.get('asr_timeout', self.asr_timeout)
+                self.llm_timeout = config.get('llm_timeout', self.llm_timeout)
+                self.tts_timeout = config.get('tts_timeout', self.tts_timeout)
+                self.breaker_failure_threshold = config.get('breaker_failure_threshold', self.breaker_failure_threshold)
+                self.breaker_recovery_timeout = config.get('breaker_recovery_timeout', self.breaker_recovery_timeout)
+                self.max_concurrent_calls = config.get('max_concurrent_calls', self.max_concurrent_calls)
+                self.max_pending_calls = config.get('max_pending_calls', self.max_pending_calls)
+                self.latency_shed_threshold = config.get('latency_shed_threshold', self.latency_shed_threshold)
+                self.tts_cache_size = config.get('tts_cache_size', self.tts_cache_size)
+                self.provider_workers = config.get('provider_workers', self.provider_workers)
                 self.model = config.get('model', 'gpt-3.5-turbo')
                 self.language = config.get('language', 'en')
                 self.max_tokens = config.get('max_tokens', 150)
@@ -63,19 +154,29 @@ class AICallCenterAgent:
         except json.JSONDecodeError:
             logger.error("Error parsing config file. Using default settings.")
 
-    def init_porcupine(self):
-        """Initialize Porcupine for wake word detection."""
+    def init_wake_word_service(self):
+        """Initialize the Porcupine-backed wake word service."""
         try:
             access_key = os.getenv('PORCUPINE_ACCESS_KEY')
             if not access_key:
                 raise ValueError("Porcupine access key not found in environment variables")
-            self.porcupine = pvporcupine.create(
-                access_key=access_key,
-                keywords=["hey agent"]
+            self.wake_word_service = WakeWordService(
+                partial(pvporcupine.create, access_key=access_key),
+                keywords=self.wake_words or [self.wake_word],
+                sensitivity=self.wake_word_sensitivity,
+                max_workers=self.wake_word_workers
             )
         except Exception as e:
             logger.error(f"Failed to initialize Porcupine: {e}")
-            self.porcupine = None
+            self.wake_word_service = None
+
+    def create_breaker(self, name):
+        """Create a circuit breaker using the configured thresholds."""
+        return CircuitBreaker(
+            name,
+            failure_threshold=self.breaker_failure_threshold,
+            recovery_timeout=self.breaker_recovery_timeout
+        )
 
     async def get_response(self, user_input):
         """Generate a response using OpenAI's chat completion API."""
@@ -84,27 +185,34 @@ class AICallCenterAgent:
         messages.extend(self.conversation_history[-5:])  # Keep last 5 messages for context
 
         try:
-            async with self.session.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers={"Authorization": f"Bearer {openai.api_key}"},
-                json={
-                    "model": self.model,
-                    "messages": messages,
-                    "max_tokens": self.max_tokens,
-                    "temperature": self.temperature,
-                }
-            ) as response:
-                response.raise_for_status()
-                result = await response.json()
-                ai_response = result['choices'][0]['message']['content']
-                self.conversation_history.append({"role": "assistant", "content": ai_response})
-                return ai_response
+            ai_response = await self.llm_breaker.call(self.request_completion, messages, timeout=self.llm_timeout)
+            self.conversation_history.append({"role": "assistant", "content": ai_response})
+            return ai_response
+        except CircuitOpenError:
+            logger.warning("LLM circuit open. Using router-only answer.")
+        except asyncio.TimeoutError:
+            logger.error("Timed out getting AI response")
         except aiohttp.ClientError as e:
             logger.error(f"Network error in getting AI response: {e}")
-            return "I'm sorry, I'm having trouble connecting. Please try again later."
         except Exception as e:
             logger.error(f"Unexpected error in getting AI response: {e}")
-            return "I'm experiencing an issue. Please try again."
+        return ROUTER_ONLY
+
+    async def request_completion(self, messages):
+        """Request a chat completion from OpenAI."""
+        async with self.session.post(
+            "https://api.openai.com/v1/chat/completions",
+            headers={"Authorization": f"Bearer {openai.api_key}"},
+            json={
+                "model": self.model,
+                "messages": messages,
+                "max_tokens": self.max_tokens,
+                "temperature": self.temperature,
+            }
+        ) as response:
+            response.raise_for_status()
+            result = await response.json()
+            return result['choices'][0]['message']['content']
 
     async def handle_query(self, query):
         """Handle user queries based on keywords."""
@@ -119,88 +227,184 @@ class AICallCenterAgent:
             return await self.get_response(query)
 
     async def listen_for_wake_word(self):
-        """Listen for the wake word using Porcupine or fallback method."""
-        if not self.porcupine:
+        """Listen for the wake word using the wake word service or fallback method."""
+        if not self.wake_word_service:
             logger.warning("Porcupine not initialized. Using default method.")
             return await self.default_listen_for_wake_word()
 
+        service = self.wake_word_service
+        stream_id = self.line_id
+        service.start()
+        service.register_stream(stream_id)
+
         pa = pyaudio.PyAudio()
         audio_stream = pa.open(
-            rate=self.porcupine.sample_rate,
+            rate=service.sample_rate,
             channels=1,
             format=pyaudio.paInt16,
             input=True,
-            frames_per_buffer=self.porcupine.frame_length
+            frames_per_buffer=service.frame_length
         )
 
+        detection = asyncio.create_task(service.wait_for_wake_word(stream_id))
+
+        async def feed_microphone():
+            # Stop via the detection task rather than cancellation so no read is in flight on close
+            while not detection.done():
+                pcm = await asyncio.to_thread(audio_stream.read, service.frame_length, False)
+                service.submit_frames(stream_id, pcm)
+
+        feeder = asyncio.create_task(feed_microphone())
         try:
-            while True:
-                pcm = audio_stream.read(self.porcupine.frame_length)
-                pcm = struct.unpack_from("h" * self.porcupine.frame_length, pcm)
-                keyword_index = self.porcupine.process(pcm)
-                if keyword_index >= 0:
-                    logger.info("Wake word detected!")
-                    return True
+            await asyncio.wait({feeder, detection}, return_when=asyncio.FIRST_COMPLETED)
+            if detection.done():
+                logger.info(f"Wake word detected: '{detection.result()}'")
+                return True
+            feeder.result()  # Surface the microphone error
+            return False
         except Exception as e:
             logger.error(f"Error in Porcupine wake word detection: {e}")
             return False
         finally:
+            detection.cancel()
+            await asyncio.gather(feeder, detection, return_exceptions=True)
+            service.unregister_stream(stream_id)
             audio_stream.close()
             pa.terminate()
 
     async def check_order_status(self, query):
         """Simulate checking order status."""
         await asyncio.sleep(1)  # Simulate network delay
-        return "Your order #12345 is in transit and expected to arrive on Friday."
+        return ORDER_STATUS
 
     def explain_return_policy(self):
         """Provide return policy information."""
-        return "Our return policy allows returns within 30 days for a full refund if the item is in original condition."
+        return RETURN_POLICY
 
     def end_call(self):
         """Offer further assistance before ending the call."""
-        return "Thank you for calling. Anything else I can assist with?"
+        return END_CALL
 
-    async def transcribe_audio(self, audio_file):
-        """Transcribe audio using OpenAI's Whisper API."""
+    async def transcribe_audio(self, wav_data):
+        """Transcribe WAV bytes using OpenAI's Whisper API, falling back to Google Speech Recognition."""
+        # Each provider gets its own file object: aiohttp closes the upload once it is sent
         try:
-            data = aiohttp.FormData()
-            data.add_field('file', audio_file, filename='audio.wav', content_type='audio/wav')
-            data.add_field('model', 'whisper-1')
-            async with self.session.post(
-                "https://api.openai.com/v1/audio/transcriptions",
-                headers={"Authorization": f"Bearer {openai.api_key}"},
-                data=data
-            ) as response:
-                response.raise_for_status()
-                result = await response.json()
-                return result.get("text", "")
+            return await self.asr_breaker.call(
+                self.transcribe_whisper, io.BytesIO(wav_data), timeout=self.asr_timeout
+            )
+        except CircuitOpenError:
+            logger.warning("Whisper circuit open. Using alternate speech recognition.")
+        except asyncio.TimeoutError:
+            logger.error("Timed out transcribing audio")
         except Exception as e:
             logger.error(f"Error in transcribing audio: {e}")
-            return None
+
+        try:
+            return await self.alt_asr_breaker.call(
+                self.transcribe_google, io.BytesIO(wav_data), timeout=self.asr_timeout
+            )
+        except CircuitOpenError:
+            logger.error("Alternate speech recognition circuit open")
+        except asyncio.TimeoutError:
+            logger.error("Timed out transcribing audio with alternate speech recognition")
+        except Exception as e:
+            logger.error(f"Error in alternate speech recognition: {e}")
+        return None
+
+    async def transcribe_whisper(self, audio_file):
+        """Transcribe a WAV file with OpenAI's Whisper API."""
+        data = aiohttp.FormData()
+        data.add_field('file', audio_file, filename='audio.wav', content_type='audio/wav')
+        data.add_field('model', 'whisper-1')
+        async with self.session.post(
+            "https://api.openai.com/v1/audio/transcriptions",
+            headers={"Authorization": f"Bearer {openai.api_key}"},
+            data=data
+        ) as response:
+            response.raise_for_status()
+            result = await response.json()
+            return result.get("text", "")
+
+    async def transcribe_google(self, audio_file):
+        """Transcribe a WAV file with Google Speech Recognition."""
+        def recognize():
+            with sr.AudioFile(audio_file) as source:
+                audio = self.recognizer.record(source)
+            try:
+                return self.recognizer.recognize_google(audio)
+            except UnknownValueError:
+                # Unintelligible speech is not a provider failure
+                return ""
+        return await self.run_provider_call(self.alt_asr_executor, recognize)
+
+    async def run_provider_call(self, executor, func, *args):
+        """Run a blocking provider SDK call in that provider's bounded pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, func, *args)
 
     async def text_to_speech(self, text):
-        """Convert text to speech using Azure Speech SDK."""
+        """Convert text to speech using Azure Speech SDK, falling back to cached audio."""
+        audio_data = await self.get_speech_audio(text)
+        if audio_data is None:
+            return
         try:
-            speech_synthesizer = speechsdk.SpeechSynthesizer(speech_config=self.speech_config)
-            result = await asyncio.to_thread(speech_synthesizer.speak_text, text)
-            if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
-                audio_data = result.audio_data
-                p = pyaudio.PyAudio()
-                stream = p.open(
-                    format=pyaudio.paInt16,
-                    channels=1,
-                    rate=24000,
-                    output=True
-                )
-                await asyncio.to_thread(stream.write, audio_data)
-                stream.stop_stream()
-                stream.close()
-                p.terminate()
-            else:
-                logger.error(f"Speech synthesis failed: {result.reason}")
+            p = pyaudio.PyAudio()
+            stream = p.open(
+                format=pyaudio.paInt16,
+                channels=1,
+                rate=24000,
+                output=True
+            )
+            await asyncio.to_thread(stream.write, audio_data)
+            stream.stop_stream()
+            stream.close()
+            p.terminate()
+        except Exception as e:
+            logger.error(f"Error in audio playback: {e}")
+
+    async def get_speech_audio(self, text):
+        """Return synthesized audio for text, using cached audio when Azure is unavailable.
+
+        Fixed prompts are synthesized once, kept in prompt_audio and never
+        evicted; other text goes through the bounded tts_cache LRU.
+        """
+        if text in self.prompt_audio:
+            return self.prompt_audio[text]
+        try:
+            audio_data = await self.tts_breaker.call(self.synthesize_speech, text, timeout=self.tts_timeout)
+        except CircuitOpenError:
+            logger.warning("TTS circuit open. Using cached audio.")
+        except asyncio.TimeoutError:
+            logger.error("Timed out synthesizing speech")
         except Exception as e:
             logger.error(f"Error in text-to-speech: {e}")
+        else:
+            if text in FIXED_PROMPTS:
+                self.prompt_audio[text] = audio_data
+            else:
+                self.tts_cache[text] = audio_data
+                self.tts_cache.move_to_end(text)
+                while len(self.tts_cache) > self.tts_cache_size:
+                    self.tts_cache.popitem(last=False)
+            return audio_data
+
+        audio_data = self.tts_cache.get(text)
+        if audio_data is None:
+            logger.warning("No cached audio available. Skipping speech output.")
+        return audio_data
+
+    async def synthesize_speech(self, text):
+        """Synthesize text to raw PCM audio with the Azure Speech SDK."""
+        speech_synthesizer = speechsdk.SpeechSynthesizer(speech_config=self.speech_config, audio_config=None)
+        result = await self.run_provider_call(self.tts_executor, speech_synthesizer.speak_text, text)
+        if result.reason != speechsdk.ResultReason.SynthesizingAudioCompleted:
+            raise RuntimeError(f"Speech synthesis failed: {result.reason}")
+        return result.audio_data
+
+    async def warm_tts_cache(self):
+        """Synthesize the agent's fixed prompts so they can be played during a TTS outage."""
+        for text in FIXED_PROMPTS:
+            await self.get_speech_audio(text)
 
     async def default_listen_for_wake_word(self):
         """Fallback method to listen for wake word using speech_recognition."""
@@ -229,14 +433,22 @@ class AICallCenterAgent:
         if not await self.listen_for_wake_word():
             return
 
+        try:
+            async with self.admission.admit():
+                await self.handle_call()
+        except OverloadedError:
+            logger.warning("Downstream services are saturated. Shedding call.")
+            await self.text_to_speech(ALL_BUSY)
+
+    async def handle_call(self):
+        """Greet the caller and answer a single query."""
         # Reset conversation history for new call
         self.conversation_history = []
         self.call_start_time = time.time()
 
         # Greet the user after wake word detection
         logger.info("Wake word detected. Greeting the user...")
-        greeting = "Hello, how can I assist you today?"
-        await self.text_to_speech(greeting)
+        await self.text_to_speech(GREETING)
 
         logger.info("Listening for query...")
         try:
@@ -250,22 +462,22 @@ class AICallCenterAgent:
                 wav_writer.setframerate(16000)
                 wav_writer.writeframes(audio.get_wav_data(convert_rate=16000, convert_width=2))
                 wav_writer.close()
-                wav_file.seek(0)
-                transcription = await self.transcribe_audio(wav_file)
-                if transcription:
-                    logger.info(f"User said: {transcription}")
-                    response = await self.handle_query(transcription)
-                    logger.info(f"Agent: {response}")
-                    await self.text_to_speech(response)
-                else:
-                    logger.warning("Failed to transcribe audio")
-                    await self.text_to_speech("Sorry, I couldn't understand that. Please try again.")
+                wav_data = wav_file.getvalue()
+            transcription = await self.transcribe_audio(wav_data)
+            if transcription:
+                logger.info(f"User said: {transcription}")
+                response = await self.handle_query(transcription)
+                logger.info(f"Agent: {response}")
+                await self.text_to_speech(response)
+            else:
+                logger.warning("Failed to transcribe audio")
+                await self.text_to_speech(NOT_UNDERSTOOD)
         except sr.WaitTimeoutError:
             logger.warning("Listening timed out.")
-            await self.text_to_speech("I didn't hear anything. Please try again.")
+            await self.text_to_speech(NOTHING_HEARD)
         except Exception as e:
             logger.error(f"An error occurred: {e}")
-            await self.text_to_speech("Sorry, an error occurred. Please try again later.")
+            await self.text_to_speech(GENERIC_ERROR)
         finally:
             self.call_duration += time.time() - self.call_start_time
 
@@ -274,6 +486,7 @@ class AICallCenterAgent:
         logger.info("AI Call Center Agent is running. Say the wake word to start.")
         async with aiohttp.ClientSession() as session:
             self.session = session
+            await self.warm_tts_cache()
             while True:
                 await self.listen_and_respond()
 
@@ -294,9 +507,13 @@ class AICallCenterAgent:
         return report
 
     def __del__(self):
-        """Cleanup Porcupine instance."""
-        if self.porcupine:
-            self.porcupine.delete()
+        """Cleanup the wake word service and provider pool."""
+        if self.wake_word_service and self.owns_wake_word_service:
+            self.wake_word_service.close()
+        # Executors are missing if __init__ failed before creating them
+        for executor in (getattr(self, 'alt_asr_executor', None), getattr(self, 'tts_executor', None)):
+            if executor:
+                executor.shutdown(wait=False)
 
 async def main():
     """Main function to run the agent."""
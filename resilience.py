@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because its circuit breaker is open."""
+
+class OverloadedError(Exception):
+    """Raised when the admission queue sheds a new call."""
+
+class CircuitBreaker:
+    """Per-dependency circuit breaker with fast-fail and half-open probing.
+
+    After failure_threshold consecutive failures the breaker opens and
+    rejects calls immediately. Once recovery_timeout has elapsed a single
+    probe call is let through; its outcome closes or re-opens the breaker.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_threshold=3, recovery_timeout=30.0, latency_alpha=0.2):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.latency_alpha = latency_alpha
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.probe_in_flight = False
+        self.latency = 0.0
+
+    def allow_request(self):
+        """Return True if a call may go through, claiming the probe slot when half-open."""
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.recovery_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            logger.info(f"Circuit '{self.name}' half-open, probing dependency")
+        if self.state == self.HALF_OPEN:
+            if self.probe_in_flight:
+                return False
+            self.probe_in_flight = True
+        return True
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info(f"Circuit '{self.name}' closed")
+        self.state = self.CLOSED
+        self.failures = 0
+        self.probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(f"Circuit '{self.name}' opened after {self.failures} failure(s)")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def record_latency(self, seconds):
+        self.latency = self.latency_alpha * seconds + (1 - self.latency_alpha) * self.latency
+
+    async def call(self, func, *args, timeout=None):
+        """Await func(*args) through the breaker, failing fast while it is open."""
+        if not self.allow_request():
+            raise CircuitOpenError(f"Circuit '{self.name}' is open")
+        start = time.monotonic()
+        try:
+            result = await asyncio.wait_for(func(*args), timeout)
+        except asyncio.CancelledError:
+            self.probe_in_flight = False
+            raise
+        except Exception:
+            self.record_latency(time.monotonic() - start)
+            self.record_failure()
+            raise
+        self.record_latency(time.monotonic() - start)
+        self.record_success()
+        return result
+
+class AdmissionQueue:
+    """Bounded admission control for concurrent calls.
+
+    Up to max_concurrent calls run at once and at most max_pending wait
+    for a slot. When the slowest downstream dependency's average latency
+    exceeds latency_threshold, the pending bound shrinks proportionally so
+    new calls are shed instead of piling up behind a slow provider. Open
+    breakers are ignored: their calls fail fast into fallbacks, so their
+    last recorded latency no longer reflects what a caller waits for.
+
+    A single agent handles one call at a time, so the queue only sheds
+    when several lines share it (see AICallCenterAgent's admission argument).
+    """
+
+    def __init__(self, max_concurrent=10, max_pending=20, latency_threshold=5.0, breakers=()):
+        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.max_pending = max_pending
+        self.latency_threshold = latency_threshold
+        self.breakers = list(breakers)
+        self.pending = 0
+
+    def watch(self, *breakers):
+        """Include more breakers' latency when computing the pending limit."""
+        for breaker in breakers:
+            # Lines sharing breakers all watch them; keep each dependency once
+            if not any(breaker is watched for watched in self.breakers):
+                self.breakers.append(breaker)
+
+    def pending_limit(self):
+        latency = max(
+            (breaker.latency for breaker in self.breakers if breaker.state != breaker.OPEN),
+            default=0.0
+        )
+        if latency <= self.latency_threshold:
+            return self.max_pending
+        return int(self.max_pending * self.latency_threshold / latency)
+
+    @asynccontextmanager
+    async def admit(self):
+        """Hold a call slot for the duration of the block, or raise OverloadedError."""
+        if self.semaphore.locked() and self.pending >= self.pending_limit():
+            raise OverloadedError("Admission queue is full")
+        self.pending += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.pending -= 1
+        try:
+            yield
+        finally:
+            self.semaphore.release()
@@ -0,0 +1,221 @@
+import asyncio
+import importlib.util
+import sys
+from unittest.mock import MagicMock
+
+import pytest
+
+from resilience import CircuitBreaker
+
+
+def _missing(name):
+    try:
+        return importlib.util.find_spec(name) is None
+    except ModuleNotFoundError:
+        return True
+
+
+def _fake_module(name, **attrs):
+    module = MagicMock(name=name)
+    for attr, value in attrs.items():
+        setattr(module, attr, value)
+    return module
+
+
+def _install_fake_sdks():
+    """Stand in for the speech, audio and API SDKs when they are not installed."""
+    fakes = {
+        "openai": _fake_module("openai"),
+        "pygame": _fake_module("pygame", mixer=MagicMock()),
+        "dotenv": _fake_module("dotenv", load_dotenv=lambda: None),
+        "aiohttp": _fake_module("aiohttp", ClientError=type("ClientError", (Exception,), {})),
+        "pvporcupine": _fake_module("pvporcupine"),
+        "pyaudio": _fake_module("pyaudio"),
+        "speech_recognition": _fake_module(
+            "speech_recognition",
+            Recognizer=MagicMock,
+            UnknownValueError=type("UnknownValueError", (Exception,), {}),
+            RequestError=type("RequestError", (Exception,), {}),
+            WaitTimeoutError=type("WaitTimeoutError", (Exception,), {}),
+        ),
+    }
+    for name, module in fakes.items():
+        if _missing(name):
+            sys.modules[name] = module
+    if _missing("azure.cognitiveservices.speech"):
+        speech = _fake_module("azure.cognitiveservices.speech")
+        cognitiveservices = _fake_module("azure.cognitiveservices", speech=speech)
+        azure = _fake_module("azure", cognitiveservices=cognitiveservices)
+        sys.modules.update({
+            "azure": azure,
+            "azure.cognitiveservices": cognitiveservices,
+            "azure.cognitiveservices.speech": speech,
+        })
+
+
+_install_fake_sdks()
+
+from ai_call_center_agent import (  # noqa: E402
+    AICallCenterAgent,
+    DEPENDENCIES,
+    FIXED_PROMPTS,
+    GREETING,
+    ROUTER_ONLY,
+)
+
+WAV_DATA = b"RIFF-fake-wav-data"
+
+
+@pytest.fixture
+def agent():
+    # A shared stub service keeps the agent from creating Porcupine
+    agent = AICallCenterAgent(wake_word_service=MagicMock())
+    agent.asr_timeout = agent.llm_timeout = agent.tts_timeout = 1.0
+    agent.model = "gpt-3.5-turbo"
+    agent.max_tokens = 150
+    agent.temperature = 0.7
+    return agent
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_transcribe_falls_back_after_whisper_consumes_upload(agent):
+    received = []
+
+    async def whisper(audio_file):
+        # aiohttp closes the upload after sending it; the server then fails
+        audio_file.read()
+        audio_file.close()
+        raise RuntimeError("503 Service Unavailable")
+
+    async def google(audio_file):
+        received.append(audio_file.read())
+        return "where is my order"
+
+    agent.transcribe_whisper = whisper
+    agent.transcribe_google = google
+
+    assert asyncio.run(agent.transcribe_audio(WAV_DATA)) == "where is my order"
+    assert received == [WAV_DATA]
+
+
+def test_transcribe_skips_whisper_when_circuit_open(agent):
+    whisper = MagicMock()
+
+    async def google(audio_file):
+        return "hello"
+
+    agent.transcribe_whisper = whisper
+    agent.transcribe_google = google
+    open_breaker(agent.asr_breaker)
+
+    assert asyncio.run(agent.transcribe_audio(WAV_DATA)) == "hello"
+    whisper.assert_not_called()
+
+
+def test_transcribe_returns_none_when_both_providers_fail(agent):
+    async def fail(audio_file):
+        raise RuntimeError("provider down")
+
+    agent.transcribe_whisper = fail
+    agent.transcribe_google = fail
+
+    assert asyncio.run(agent.transcribe_audio(WAV_DATA)) is None
+
+
+def test_get_response_falls_back_to_router_only(agent):
+    async def fail(messages):
+        raise RuntimeError("500 Internal Server Error")
+
+    agent.request_completion = fail
+
+    assert asyncio.run(agent.get_response("tell me a joke")) == ROUTER_ONLY
+    assert agent.conversation_history[-1]["role"] == "user"
+
+
+def test_get_response_fails_fast_when_circuit_open(agent):
+    completion = MagicMock()
+    agent.request_completion = completion
+    open_breaker(agent.llm_breaker)
+
+    assert asyncio.run(agent.get_response("tell me a joke")) == ROUTER_ONLY
+    completion.assert_not_called()
+
+
+def test_prompt_audio_served_without_synthesis(agent):
+    synthesize = MagicMock()
+    agent.synthesize_speech = synthesize
+    agent.prompt_audio[GREETING] = b"greeting-audio"
+
+    assert asyncio.run(agent.get_speech_audio(GREETING)) == b"greeting-audio"
+    synthesize.assert_not_called()
+
+
+def test_warm_tts_cache_covers_router_answers(agent):
+    async def synthesize(text):
+        return text.encode()
+
+    agent.synthesize_speech = synthesize
+    asyncio.run(agent.warm_tts_cache())
+
+    assert set(agent.prompt_audio) == set(FIXED_PROMPTS)
+    assert agent.explain_return_policy() in agent.prompt_audio
+    assert agent.end_call() in agent.prompt_audio
+    assert asyncio.run(agent.check_order_status("order status")) in agent.prompt_audio
+    assert not agent.tts_cache
+
+
+def test_tts_cache_served_when_circuit_open(agent):
+    async def synthesize(text):
+        return text.encode()
+
+    agent.synthesize_speech = synthesize
+    asyncio.run(agent.get_speech_audio("Your refund was issued."))
+    open_breaker(agent.tts_breaker)
+
+    assert asyncio.run(agent.get_speech_audio("Your refund was issued.")) == b"Your refund was issued."
+    assert asyncio.run(agent.get_speech_audio("Something new.")) is None
+
+
+def test_tts_cache_evicts_least_recently_used(agent):
+    async def synthesize(text):
+        return text.encode()
+
+    agent.synthesize_speech = synthesize
+    agent.tts_cache_size = 2
+    for text in ("one", "two", "three"):
+        asyncio.run(agent.get_speech_audio(text))
+
+    assert list(agent.tts_cache) == ["two", "three"]
+
+
+def test_agents_share_injected_breakers(agent):
+    breakers = {name: CircuitBreaker(name) for name in DEPENDENCIES}
+    first = AICallCenterAgent(admission=agent.admission, wake_word_service=MagicMock(), breakers=breakers)
+    second = AICallCenterAgent(admission=agent.admission, wake_word_service=MagicMock(), breakers=breakers)
+
+    assert first.llm_breaker is second.llm_breaker is breakers["llm"]
+    open_breaker(first.tts_breaker)
+    assert second.tts_breaker.state == CircuitBreaker.OPEN
+    # The shared queue watches the original agent's breakers plus one copy of the shared set
+    assert len(agent.admission.breakers) == 2 * len(DEPENDENCIES)
+    assert any(watched is breakers["alt_asr"] for watched in agent.admission.breakers)
+
+
+def test_agents_get_unique_wake_word_streams():
+    service = MagicMock()
+    first = AICallCenterAgent(wake_word_service=service)
+    second = AICallCenterAgent(wake_word_service=service)
+
+    assert first.line_id != second.line_id
+    assert not first.owns_wake_word_service
+
+
+def test_providers_use_separate_pools():
+    agent = AICallCenterAgent(wake_word_service=MagicMock())
+    assert agent.alt_asr_executor is not agent.tts_executor
+    assert agent.recognizer.operation_timeout == agent.asr_timeout
@@ -0,0 +1,167 @@
+import asyncio
+
+import pytest
+
+from resilience import AdmissionQueue, CircuitBreaker, CircuitOpenError, OverloadedError
+
+
+async def fail():
+    raise RuntimeError("provider down")
+
+
+async def hang():
+    await asyncio.sleep(10)
+
+
+async def succeed():
+    return "ok"
+
+
+def test_breaker_opens_after_threshold_and_fails_fast():
+    async def scenario():
+        breaker = CircuitBreaker("llm", failure_threshold=2, recovery_timeout=60)
+        with pytest.raises(RuntimeError):
+            await breaker.call(fail)
+        assert breaker.state == CircuitBreaker.CLOSED
+        with pytest.raises(asyncio.TimeoutError):
+            await breaker.call(hang, timeout=0.01)
+        assert breaker.state == CircuitBreaker.OPEN
+
+        calls = []
+
+        async def tracked():
+            calls.append(1)
+
+        with pytest.raises(CircuitOpenError):
+            await breaker.call(tracked)
+        assert calls == []
+
+    asyncio.run(scenario())
+
+
+def test_breaker_success_resets_failure_count():
+    async def scenario():
+        breaker = CircuitBreaker("asr", failure_threshold=2)
+        with pytest.raises(RuntimeError):
+            await breaker.call(fail)
+        assert await breaker.call(succeed) == "ok"
+        with pytest.raises(RuntimeError):
+            await breaker.call(fail)
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    asyncio.run(scenario())
+
+
+def test_half_open_allows_single_probe():
+    async def scenario():
+        breaker = CircuitBreaker("tts", failure_threshold=1, recovery_timeout=0.01)
+        with pytest.raises(RuntimeError):
+            await breaker.call(fail)
+        await asyncio.sleep(0.02)
+
+        assert breaker.allow_request()
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert not breaker.allow_request()
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    asyncio.run(scenario())
+
+
+def test_failed_probe_reopens_breaker():
+    async def scenario():
+        breaker = CircuitBreaker("tts", failure_threshold=3, recovery_timeout=0.01)
+        for _ in range(3):
+            with pytest.raises(RuntimeError):
+                await breaker.call(fail)
+        await asyncio.sleep(0.02)
+
+        with pytest.raises(RuntimeError):
+            await breaker.call(fail)
+        assert breaker.state == CircuitBreaker.OPEN
+        with pytest.raises(CircuitOpenError):
+            await breaker.call(succeed)
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_probe_releases_probe_slot():
+    async def scenario():
+        breaker = CircuitBreaker("llm", failure_threshold=1, recovery_timeout=0.01)
+        with pytest.raises(RuntimeError):
+            await breaker.call(fail)
+        await asyncio.sleep(0.02)
+
+        probe = asyncio.create_task(breaker.call(hang))
+        await asyncio.sleep(0)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        assert await breaker.call(succeed) == "ok"
+
+    asyncio.run(scenario())
+
+
+def test_pending_limit_shrinks_with_latency():
+    breaker = CircuitBreaker("llm")
+    queue = AdmissionQueue(max_pending=20, latency_threshold=2.0, breakers=[breaker])
+    breaker.latency = 1.0
+    assert queue.pending_limit() == 20
+    breaker.latency = 8.0
+    assert queue.pending_limit() == 5
+    breaker.latency = 100.0
+    assert queue.pending_limit() == 0
+
+
+def test_pending_limit_ignores_open_breakers():
+    slow = CircuitBreaker("asr", failure_threshold=1)
+    queue = AdmissionQueue(max_pending=20, latency_threshold=2.0)
+    queue.watch(slow)
+    slow.latency = 40.0
+    assert queue.pending_limit() == 1
+    slow.record_failure()
+    assert slow.state == CircuitBreaker.OPEN
+    assert queue.pending_limit() == 20
+
+
+def test_admission_sheds_once_pending_limit_reached():
+    async def scenario():
+        breaker = CircuitBreaker("llm")
+        queue = AdmissionQueue(max_concurrent=1, max_pending=2, latency_threshold=1.0, breakers=[breaker])
+        release = asyncio.Event()
+
+        async def call():
+            async with queue.admit():
+                await release.wait()
+
+        active = asyncio.create_task(call())
+        waiting = [asyncio.create_task(call()) for _ in range(2)]
+        await asyncio.sleep(0)
+        assert queue.pending == 2
+
+        with pytest.raises(OverloadedError):
+            async with queue.admit():
+                pass
+
+        release.set()
+        await asyncio.gather(active, *waiting)
+        assert queue.pending == 0
+
+    asyncio.run(scenario())
+
+
+def test_admission_sheds_immediately_under_high_latency():
+    async def scenario():
+        breaker = CircuitBreaker("tts")
+        breaker.latency = 10.0
+        queue = AdmissionQueue(max_concurrent=1, max_pending=4, latency_threshold=1.0, breakers=[breaker])
+
+        async with queue.admit():
+            with pytest.raises(OverloadedError):
+                async with queue.admit():
+                    pass
+        # With a free slot the call is admitted regardless of latency
+        async with queue.admit():
+            pass
+
+    asyncio.run(scenario())
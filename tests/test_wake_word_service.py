@@ -0,0 +1,145 @@
+import asyncio
+import struct
+import threading
+
+from wake_word_service import WakeWordService
+
+FRAME_LENGTH = 512
+SILENCE = struct.pack("h" * FRAME_LENGTH, *[0] * FRAME_LENGTH)
+
+
+def keyword_frame(keyword_index):
+    """A frame the stub detector reports as keyword_index."""
+    return struct.pack("h" * FRAME_LENGTH, *[keyword_index + 1] * FRAME_LENGTH)
+
+
+class StubPorcupine:
+    sample_rate = 16000
+    frame_length = FRAME_LENGTH
+
+    def __init__(self, keywords, sensitivities):
+        self.sensitivities = sensitivities
+        self.deleted = False
+        self.processed = 0
+
+    def process(self, pcm):
+        assert not self.deleted, "process() called on a deleted Porcupine instance"
+        self.processed += 1
+        return pcm[0] - 1 if pcm[0] > 0 else -1
+
+    def delete(self):
+        self.deleted = True
+
+
+class FailingPorcupine(StubPorcupine):
+    def process(self, pcm):
+        raise RuntimeError("detector failure")
+
+
+class BlockingPorcupine(StubPorcupine):
+    def __init__(self, keywords, sensitivities):
+        super().__init__(keywords, sensitivities)
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def process(self, pcm):
+        self.entered.set()
+        self.release.wait(5)
+        return super().process(pcm)
+
+
+def create_service(factory=StubPorcupine, **kwargs):
+    return WakeWordService(factory, ["hey agent", "computer"], tick_interval=0.01, **kwargs)
+
+
+def test_detections_delivered_across_streams_in_one_tick():
+    async def scenario():
+        service = create_service(max_workers=2)
+        service.start()
+        for stream_id in range(5):
+            service.register_stream(stream_id, sensitivity=0.3)
+        for stream_id in range(5):
+            service.submit_frames(stream_id, SILENCE * 2)
+        service.submit_frames(1, keyword_frame(0))
+        service.submit_frames(3, SILENCE + keyword_frame(1))
+
+        detections = await asyncio.wait_for(
+            asyncio.gather(service.wait_for_wake_word(1), service.wait_for_wake_word(3)), 1
+        )
+        assert detections == ["hey agent", "computer"]
+        assert service.streams[1]["porcupine"].sensitivities == [0.3, 0.3]
+        assert not service.streams[0]["event"].is_set()
+        service.close()
+
+    asyncio.run(scenario())
+
+
+def test_partial_frames_stay_buffered():
+    async def scenario():
+        service = create_service()
+        service.start()
+        service.register_stream("a")
+        service.submit_frames("a", SILENCE + b"\0\0")
+        await asyncio.sleep(0.1)
+        assert len(service.streams["a"]["buffer"]) == 2
+        assert service.streams["a"]["porcupine"].processed == 1
+        service.close()
+
+    asyncio.run(scenario())
+
+
+def test_failing_stream_does_not_drop_other_detections():
+    async def scenario():
+        service = create_service(max_workers=1)
+        service.start()
+        service.register_stream("bad")
+        service.streams["bad"]["porcupine"] = FailingPorcupine([], [])
+        service.register_stream("good")
+        service.submit_frames("bad", SILENCE)
+        service.submit_frames("good", keyword_frame(0))
+
+        assert await asyncio.wait_for(service.wait_for_wake_word("good"), 1) == "hey agent"
+        service.close()
+
+    asyncio.run(scenario())
+
+
+def test_unregister_during_batch_defers_delete():
+    async def scenario():
+        service = create_service()
+        service.start()
+        service.register_stream("x")
+        porcupine = BlockingPorcupine([], [])
+        service.streams["x"]["porcupine"] = porcupine
+        service.submit_frames("x", SILENCE)
+
+        await asyncio.to_thread(porcupine.entered.wait, 1)
+        service.unregister_stream("x")
+        assert not porcupine.deleted
+        porcupine.release.set()
+        for _ in range(100):
+            if porcupine.deleted:
+                break
+            await asyncio.sleep(0.01)
+        assert porcupine.deleted
+        service.close()
+
+    asyncio.run(scenario())
+
+
+def test_close_waits_for_in_flight_batch():
+    async def scenario():
+        service = create_service()
+        service.start()
+        service.register_stream("x")
+        porcupine = BlockingPorcupine([], [])
+        service.streams["x"]["porcupine"] = porcupine
+        service.submit_frames("x", SILENCE)
+
+        await asyncio.to_thread(porcupine.entered.wait, 1)
+        threading.Timer(0.05, porcupine.release.set).start()
+        service.close()
+        assert porcupine.deleted
+        assert porcupine.processed == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+class WakeWordService:
+    """Batched wake word detection for many audio streams.
+
+    Callers push raw 16-bit mono PCM with submit_frames() and await
+    wait_for_wake_word(). Each tick, buffered audio from every stream is
+    split into Porcupine frames and processed in a worker pool, so the
+    event loop never blocks on detection. When no audio is pending the
+    service sleeps on an event instead of polling.
+
+    create_porcupine is called as create_porcupine(keywords=..., sensitivities=...)
+    and must return a Porcupine-like detector, e.g. a partial of
+    pvporcupine.create bound to an access key.
+    """
+
+    def __init__(self, create_porcupine, keywords, sensitivity=0.5, max_workers=4, tick_interval=0.05):
+        self.create_porcupine = create_porcupine
+        self.keywords = list(keywords)
+        self.sensitivity = sensitivity
+        self.tick_interval = tick_interval
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="wake-word")
+        self.max_workers = max_workers
+        self.streams = {}
+        self.detections = {}
+        self._frames_ready = asyncio.Event()
+        self._task = None
+        # Streams handed to the worker pool in the current batch, and detectors to free once it returns
+        self._in_flight = set()
+        self._pending_deletes = []
+
+        # Create a probe instance to validate the access key and keywords up front
+        probe = self._create_porcupine(sensitivity)
+        self.sample_rate = probe.sample_rate
+        self.frame_length = probe.frame_length
+        probe.delete()
+
+    def _create_porcupine(self, sensitivity):
+        return self.create_porcupine(
+            keywords=self.keywords,
+            sensitivities=[sensitivity] * len(self.keywords)
+        )
+
+    def register_stream(self, stream_id, sensitivity=None):
+        """Register a stream and return the event set when a keyword is detected."""
+        if stream_id in self.streams:
+            return self.streams[stream_id]["event"]
+        self.streams[stream_id] = {
+            "porcupine": self._create_porcupine(sensitivity if sensitivity is not None else self.sensitivity),
+            "buffer": bytearray(),
+            "event": asyncio.Event(),
+        }
+        return self.streams[stream_id]["event"]
+
+    def unregister_stream(self, stream_id):
+        """Remove a stream and release its Porcupine instance.
+
+        If the stream is part of the batch currently being processed, the
+        instance is released after the batch returns instead.
+        """
+        stream = self.streams.pop(stream_id, None)
+        self.detections.pop(stream_id, None)
+        if stream is None:
+            return
+        if id(stream) in self._in_flight:
+            self._pending_deletes.append(stream["porcupine"])
+        else:
+            stream["porcupine"].delete()
+
+    def submit_frames(self, stream_id, pcm):
+        """Buffer raw 16-bit PCM bytes for a stream until the next tick."""
+        stream = self.streams.get(stream_id)
+        if stream is None or stream["event"].is_set():
+            return
+        stream["buffer"].extend(pcm)
+        self._frames_ready.set()
+
+    async def wait_for_wake_word(self, stream_id):
+        """Wait until a keyword is detected on a stream and return it."""
+        event = self.register_stream(stream_id)
+        await event.wait()
+        event.clear()
+        return self.detections.pop(stream_id, None)
+
+    def start(self):
+        """Start the batching loop on the running event loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        frame_bytes = self.frame_length * 2
+        while True:
+            await self._frames_ready.wait()
+            # Give other streams a moment to contribute to this batch
+            await asyncio.sleep(self.tick_interval)
+            self._frames_ready.clear()
+
+            batch = []
+            for stream_id, stream in self.streams.items():
+                usable = len(stream["buffer"]) - len(stream["buffer"]) % frame_bytes
+                if usable:
+                    pcm = bytes(stream["buffer"][:usable])
+                    del stream["buffer"][:usable]
+                    batch.append((stream_id, stream, pcm))
+            if not batch:
+                continue
+
+            self._in_flight = {id(stream) for _, stream, _ in batch}
+            chunks = [batch[i::self.max_workers] for i in range(min(self.max_workers, len(batch)))]
+            # Errors are handled per stream in _process_chunk. If this task is cancelled
+            # mid-batch, close() releases the pending detectors once the workers finish.
+            results = await asyncio.gather(
+                *(loop.run_in_executor(self.executor, self._process_chunk, chunk) for chunk in chunks)
+            )
+            self._in_flight = set()
+            self._release_pending()
+
+            for chunk_result in results:
+                for stream_id, stream, keyword_index in chunk_result:
+                    # Skip streams unregistered (or replaced) while the batch was running
+                    if self.streams.get(stream_id) is not stream:
+                        continue
+                    self.detections[stream_id] = self.keywords[keyword_index]
+                    stream["buffer"].clear()
+                    stream["event"].set()
+
+    def _process_chunk(self, chunk):
+        """Run Porcupine over every buffered frame in a chunk of streams (worker thread)."""
+        detected = []
+        for stream_id, stream, pcm in chunk:
+            porcupine = stream["porcupine"]
+            try:
+                frame_length = porcupine.frame_length
+                for offset in range(0, len(pcm), frame_length * 2):
+                    frame = struct.unpack_from("h" * frame_length, pcm, offset)
+                    keyword_index = porcupine.process(frame)
+                    if keyword_index >= 0:
+                        detected.append((stream_id, stream, keyword_index))
+                        break
+            except Exception as e:
+                # One failing stream must not drop detections for the rest of the batch
+                logger.error(f"Error in wake word detection for stream {stream_id!r}: {e}")
+        return detected
+
+    def _release_pending(self):
+        for porcupine in self._pending_deletes:
+            porcupine.delete()
+        self._pending_deletes = []
+
+    def close(self):
+        """Stop the batching loop and release all Porcupine instances."""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        # Let any in-flight batch finish before freeing the detectors it is using
+        self.executor.shutdown(wait=True)
+        self._in_flight = set()
+        for stream_id in list(self.streams):
+            self.unregister_stream(stream_id)
+        self._release_pending()